@@ -1,7 +1,7 @@
 import matplotlib
 matplotlib.use('Agg')
 from matplotlib import pyplot as plt
-from flask import Flask, request, jsonify, session, send_from_directory
+from flask import Flask, request, jsonify, session, send_from_directory, g
 from flask_cors import CORS
 from qiskit import QuantumCircuit, transpile, execute
 from qiskit.visualization import plot_bloch_multivector, plot_histogram
@@ -17,6 +17,8 @@ import tempfile
 import uuid
 from werkzeug.utils import secure_filename
 import traceback
+from statevector_store import StatevectorStore
+from speculation import SpeculativeEngine, describe_state
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Change this in production
@@ -84,6 +86,66 @@ UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'qasm', 'pdf'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Statevectors are shared between worker processes through memory-mapped files
+app.config['STATEVECTOR_MEMORY_DIR'] = os.environ.get('STATEVECTOR_MEMORY_DIR')
+app.config['STATEVECTOR_DISK_DIR'] = os.environ.get('STATEVECTOR_DISK_DIR')
+# Unset means 512 MB, capped by the size of the memory directory's filesystem
+app.config['STATEVECTOR_MEMORY_LIMIT'] = (int(os.environ['STATEVECTOR_MEMORY_LIMIT'])
+                                          if 'STATEVECTOR_MEMORY_LIMIT' in os.environ else None)
+app.config['STATEVECTOR_DISK_LIMIT'] = int(os.environ.get('STATEVECTOR_DISK_LIMIT', 4 * 1024 * 1024 * 1024))
+statevector_store = StatevectorStore(
+    memory_dir=app.config['STATEVECTOR_MEMORY_DIR'],
+    disk_dir=app.config['STATEVECTOR_DISK_DIR'],
+    memory_limit=app.config['STATEVECTOR_MEMORY_LIMIT'],
+    disk_limit=app.config['STATEVECTOR_DISK_LIMIT']
+)
+
+def get_statevector(circuit):
+    backend = Aer.get_backend('statevector_simulator')
+    compute = lambda: execute(circuit, backend).result().get_statevector().data
+    # Measurements and resets collapse the state at random, so caching would
+    # pin a single outcome
+    if any(instruction.operation.name in ('measure', 'reset') for instruction in circuit.data):
+        return compute()
+    return statevector_store.get_or_compute(circuit.qasm(), compute)
+
+# Likely next gates are precomputed in the background while the user is idle
+app.config['SPECULATION_MAX_CANDIDATES'] = int(os.environ.get('SPECULATION_MAX_CANDIDATES', 60))
+app.config['SPECULATION_TIME_BUDGET'] = float(os.environ.get('SPECULATION_TIME_BUDGET', 0.5))
+app.config['SPECULATION_MEMORY_LIMIT'] = int(os.environ.get('SPECULATION_MEMORY_LIMIT', 16 * 1024 * 1024))
+app.config['SPECULATION_CPU_SHARE'] = float(os.environ.get('SPECULATION_CPU_SHARE', 0.25))
+GATE_HISTORY_LENGTH = 20
+speculative_engine = SpeculativeEngine(
+    statevector_store,
+    max_candidates=app.config['SPECULATION_MAX_CANDIDATES'],
+    time_budget=app.config['SPECULATION_TIME_BUDGET'],
+    memory_limit=app.config['SPECULATION_MEMORY_LIMIT'],
+    cpu_share=app.config['SPECULATION_CPU_SHARE']
+)
+
+# Endpoints that compete with speculation for compute
+SIMULATION_ENDPOINTS = {
+    'upload_qasm', 'init_circuit', 'add_gate', 'run_simulation',
+    'optimize_circuit', 'noise_simulation', 'verify_challenge'
+}
+
+def session_id():
+    if 'session_id' not in session:
+        session['session_id'] = uuid.uuid4().hex
+    return session['session_id']
+
+@app.before_request
+def pause_speculation():
+    # Real requests take priority over speculative work from every session
+    if request.method != 'OPTIONS' and request.endpoint in SIMULATION_ENDPOINTS:
+        g.speculation_paused = True
+        speculative_engine.begin_request(session.get('session_id'))
+
+@app.teardown_request
+def resume_speculation(exc):
+    if g.pop('speculation_paused', False):
+        speculative_engine.end_request()
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -144,8 +206,7 @@ def upload_qasm():
         bloch_images = []
         if backend_name == 'statevector_simulator':
             try:
-                result = execute(circuit, backend).result()
-                statevector = result.get_statevector()
+                statevector = get_statevector(circuit)
                 
                 buf = io.BytesIO()
                 fig = plot_bloch_multivector(statevector)
@@ -229,7 +290,8 @@ def init_circuit():
             }), 400
 
         circuit = QuantumCircuit(num_qubits)
-        session['current_circuit'] = circuit.qasm()
+        qasm = circuit.qasm()
+        session['current_circuit'] = qasm
 
         # Create a single Bloch sphere image for all qubits in |0> state
         buf = io.BytesIO()
@@ -240,6 +302,11 @@ def init_circuit():
         bloch_image = base64.b64encode(buf.getvalue()).decode('utf-8')
         bloch_images = [bloch_image] * num_qubits
 
+        state = np.zeros(2 ** num_qubits, dtype=complex)
+        state[0] = 1
+        speculative_engine.schedule(session_id(), StatevectorStore.key(qasm), state, num_qubits,
+                                    session.get('gate_history', []))
+
         return jsonify({
             'success': True,
             'bloch_spheres': bloch_images,
@@ -285,7 +352,8 @@ def add_gate():
         target = data['target']
         control = data.get('control')
 
-        circuit = QuantumCircuit.from_qasm_str(session['current_circuit'])
+        base_qasm = session['current_circuit']
+        circuit = QuantumCircuit.from_qasm_str(base_qasm)
 
         if target >= circuit.num_qubits:
             return jsonify({
@@ -327,7 +395,13 @@ def add_gate():
                 'error': f'Unknown gate type: {gate_type}'
             }), 400
 
-        session['current_circuit'] = circuit.qasm()
+        qasm = circuit.qasm()
+        session['current_circuit'] = qasm
+
+        # Only the control qubit of two-qubit gates is part of the click
+        clicked_control = control if gate_type in ('cx', 'swap') else None
+        history = session.get('gate_history', []) + [[gate_type, target, clicked_control]]
+        session['gate_history'] = history[-GATE_HISTORY_LENGTH:]
 
         # Draw circuit
         buf = io.BytesIO()
@@ -337,10 +411,17 @@ def add_gate():
         buf.seek(0)
         circuit_image = base64.b64encode(buf.getvalue()).decode('utf-8')
 
-        # Get statevector and plot Bloch spheres
-        backend = Aer.get_backend('statevector_simulator')
-        state = execute(circuit, backend).result().get_statevector()
-        
+        # Get statevector and plot Bloch spheres, using the speculative result
+        # when this click was precomputed
+        speculative = speculative_engine.lookup(StatevectorStore.key(base_qasm),
+                                                gate_type, target, clicked_control)
+        if speculative is not None:
+            state = statevector_store.put(qasm, speculative['statevector'])
+            state_info = speculative
+        else:
+            state = get_statevector(circuit)
+            state_info = describe_state(state, circuit.num_qubits)
+
         buf = io.BytesIO()
         fig = plot_bloch_multivector(state)
         plt.savefig(buf, format='png', bbox_inches='tight')
@@ -349,11 +430,16 @@ def add_gate():
         bloch_image = base64.b64encode(buf.getvalue()).decode('utf-8')
         bloch_images = [bloch_image] * circuit.num_qubits
 
+        speculative_engine.schedule(session_id(), StatevectorStore.key(qasm), state,
+                                    circuit.num_qubits, session['gate_history'])
+
         return jsonify({
             'success': True,
             'gates': [str(op) for op in circuit.data],
             'circuit_image': circuit_image,
-            'bloch_spheres': bloch_images
+            'bloch_spheres': bloch_images,
+            'bloch_vectors': state_info['bloch_vectors'],
+            'probabilities': state_info['probabilities']
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -506,7 +592,7 @@ def noise_simulation():
         fidelity = None
         if any([depolarizing, bit_flip, phase_flip]):
             ideal_backend = Aer.get_backend('statevector_simulator')
-            ideal_state = execute(circuit, ideal_backend).result().get_statevector()
+            ideal_state = get_statevector(circuit)
             noisy_state = execute(circuit, ideal_backend,
                 noise_model=noise_model).result().get_statevector()
             fidelity = float(np.abs(np.dot(ideal_state.conj(), noisy_state))**2)
@@ -620,9 +706,8 @@ def verify_challenge():
                 ref_circuit.cx(qubits[0], qubits[1])
 
         # Compare states
-        backend = Aer.get_backend('statevector_simulator')
-        user_state = execute(user_circuit, backend).result().get_statevector()
-        ref_state = execute(ref_circuit, backend).result().get_statevector()
+        user_state = get_statevector(user_circuit)
+        ref_state = get_statevector(ref_circuit)
         
         # Calculate state fidelity
         fidelity = np.abs(np.dot(user_state.conj(), ref_state))**2
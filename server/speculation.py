@@ -0,0 +1,265 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+SINGLE_QUBIT_GATES = {
+    'h': np.array([[1, 1], [1, -1]], dtype=np.complex128) / np.sqrt(2),
+    'x': np.array([[0, 1], [1, 0]], dtype=np.complex128),
+    'y': np.array([[0, -1j], [1j, 0]], dtype=np.complex128),
+    'z': np.array([[1, 0], [0, -1]], dtype=np.complex128),
+}
+TWO_QUBIT_GATES = ('cx', 'swap')
+
+
+def _axis(num_qubits, qubit):
+    # Qiskit orders amplitudes little-endian, so qubit 0 is the last tensor axis
+    return num_qubits - 1 - qubit
+
+
+def apply_gate(state, num_qubits, gate, target, control=None):
+    psi = np.asarray(state, dtype=np.complex128).reshape((2,) * num_qubits)
+    t = _axis(num_qubits, target)
+
+    if gate in SINGLE_QUBIT_GATES:
+        psi = np.moveaxis(np.tensordot(SINGLE_QUBIT_GATES[gate], psi, axes=([1], [t])), 0, t)
+    elif gate == 'cx':
+        c = _axis(num_qubits, control)
+        psi = psi.copy()
+        on = [slice(None)] * num_qubits
+        on[c] = 1
+        on = tuple(on)
+        # After fixing the control axis the target axis shifts down by one if it came after it
+        psi[on] = np.flip(psi[on], axis=t - 1 if t > c else t)
+    elif gate == 'swap':
+        psi = np.swapaxes(psi, t, _axis(num_qubits, control))
+    else:
+        raise ValueError(f'Unknown gate type: {gate}')
+
+    return np.ascontiguousarray(psi).reshape(-1)
+
+
+def describe_state(state, num_qubits):
+    """Bloch vectors per qubit and nonzero basis-state probabilities."""
+    state = np.asarray(state, dtype=np.complex128)
+    psi = state.reshape((2,) * num_qubits)
+
+    bloch_vectors = []
+    for qubit in range(num_qubits):
+        m = np.moveaxis(psi, _axis(num_qubits, qubit), 0).reshape(2, -1)
+        rho = m @ m.conj().T
+        bloch_vectors.append([
+            float(2 * rho[0, 1].real),
+            float(2 * rho[1, 0].imag),
+            float((rho[0, 0] - rho[1, 1]).real)
+        ])
+
+    probs = np.abs(state) ** 2
+    probabilities = {
+        format(int(i), f'0{num_qubits}b'): float(probs[i])
+        for i in np.flatnonzero(probs > 1e-12)
+    }
+
+    return {'bloch_vectors': bloch_vectors, 'probabilities': probabilities}
+
+
+def candidate_gates(num_qubits):
+    for gate in SINGLE_QUBIT_GATES:
+        for target in range(num_qubits):
+            yield (gate, target, None)
+    for gate in TWO_QUBIT_GATES:
+        for control in range(num_qubits):
+            for target in range(num_qubits):
+                if control != target:
+                    yield (gate, target, control)
+
+
+def rank_candidates(num_qubits, history, decay=0.8):
+    """Order candidates by how closely they match recent clicks, newest first."""
+    scores = {}
+    for candidate in candidate_gates(num_qubits):
+        gate, target, control = candidate
+        score = 0.0
+        weight = 1.0
+        for past_gate, past_target, past_control in reversed(history):
+            if (past_gate, past_target, past_control) == candidate:
+                score += 3 * weight
+            if past_gate == gate:
+                score += weight
+            if past_target == target:
+                score += 0.5 * weight
+            weight *= decay
+        scores[candidate] = score
+
+    # sorted() is stable, so ties keep the default gate order
+    return sorted(scores, key=lambda c: -scores[c])
+
+
+def _result_size(result):
+    # Rough size of the Python objects, enough to keep the cache bounded
+    probabilities = result['probabilities']
+    return (sys.getsizeof(probabilities)
+            + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in probabilities.items())
+            + sum(sys.getsizeof(v) + 3 * sys.getsizeof(0.0) for v in result['bloch_vectors']))
+
+
+class SpeculativeEngine:
+    """Precomputes the outcome of likely next gates in a background thread.
+
+    Each session has at most one pending job. ``schedule`` replaces that
+    session's job with the candidates reachable from its new circuit state,
+    and sessions are served in the order they were scheduled. At most
+    ``max_candidates`` are computed per state, using at most ``time_budget``
+    seconds of compute. The thread sleeps between candidates so it uses at
+    most ``cpu_share`` of a core, however many sessions are queued.
+
+    While any request between ``begin_request`` and ``end_request`` is
+    running, speculation pauses: the current job goes back to the front of
+    the queue and resumes once the process is idle. ``begin_request`` also
+    drops the requesting session's own job, since its state is about to
+    change.
+
+    Speculative statevectors are written to the shared ``store``, so a
+    matching click is served from them by any worker. Bloch vectors and
+    probabilities are cached in this process up to ``memory_limit`` bytes,
+    least recently used first out, and recomputed from the stored state
+    elsewhere.
+    """
+
+    def __init__(self, store, max_candidates=60, time_budget=0.5, memory_limit=16 * 1024 * 1024,
+                 cpu_share=0.25):
+        self.store = store
+        self.max_candidates = max_candidates
+        self.time_budget = time_budget
+        self.memory_limit = memory_limit
+        self.cpu_share = cpu_share
+        self._results = OrderedDict()
+        self._result_bytes = 0
+        self._jobs = OrderedDict()
+        self._running = None
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def state_name(base_key, gate, target, control=None):
+        return f'speculative:{base_key}:{gate}:{target}:{control}'
+
+    def schedule(self, session_id, base_key, state, num_qubits, history):
+        if self.max_candidates <= 0:
+            return
+        job = {
+            'cancelled': threading.Event(),
+            'base_key': base_key,
+            'state': np.array(state, dtype=np.complex128),
+            'num_qubits': num_qubits,
+            'candidates': rank_candidates(num_qubits, history)[:self.max_candidates],
+            'spent': 0.0
+        }
+        with self._lock:
+            self._cancel(session_id)
+            self._jobs[session_id] = job
+            if self._thread is None:
+                # Started lazily so that forking servers get one thread per worker
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def cancel(self, session_id):
+        with self._lock:
+            self._cancel(session_id)
+
+    def _cancel(self, session_id):
+        self._jobs.pop(session_id, None)
+        if self._running is not None and self._running[0] == session_id:
+            self._running[1]['cancelled'].set()
+
+    def begin_request(self, session_id=None):
+        with self._lock:
+            self._active += 1
+            if session_id is not None:
+                self._cancel(session_id)
+
+    def end_request(self):
+        with self._lock:
+            self._active -= 1
+        self._wakeup.set()
+
+    def lookup(self, base_key, gate, target, control=None):
+        state = self.store.get(self.state_name(base_key, gate, target, control))
+        if state is None:
+            return None
+
+        key = (base_key, gate, target, control)
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None:
+                self._results.move_to_end(key)
+        if entry is not None:
+            result = entry[0]
+        else:
+            # Computed by another worker
+            result = describe_state(state, state.size.bit_length() - 1)
+        return dict(result, statevector=state)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                with self._lock:
+                    if self._active or not self._jobs:
+                        break
+                    session_id, job = self._jobs.popitem(last=False)
+                    self._running = (session_id, job)
+                finished = False
+                try:
+                    finished = self._speculate(job)
+                finally:
+                    with self._lock:
+                        self._running = None
+                        # Resume a paused job first, unless it was replaced meanwhile
+                        if not finished and not job['cancelled'].is_set() \
+                                and session_id not in self._jobs:
+                            self._jobs[session_id] = job
+                            self._jobs.move_to_end(session_id, last=False)
+
+    def _speculate(self, job):
+        """Returns False if the job was paused and should be resumed later."""
+        base_key, state, num_qubits = job['base_key'], job['state'], job['num_qubits']
+        while job['candidates']:
+            if job['cancelled'].is_set() or job['spent'] > self.time_budget:
+                return True
+            if self._active:
+                return False
+
+            gate, target, control = job['candidates'].pop(0)
+            key = (base_key, gate, target, control)
+            with self._lock:
+                if key in self._results:
+                    continue
+
+            started = time.monotonic()
+            name = self.state_name(base_key, gate, target, control)
+            next_state = self.store.get(name)
+            if next_state is None:
+                next_state = self.store.put(name, apply_gate(state, num_qubits, gate, target, control))
+            self._store(key, describe_state(next_state, num_qubits))
+            elapsed = time.monotonic() - started
+            job['spent'] += elapsed
+
+            if self.cpu_share < 1:
+                time.sleep(elapsed * (1 - self.cpu_share) / self.cpu_share)
+        return True
+
+    def _store(self, key, result):
+        size = _result_size(result)
+        with self._lock:
+            self._results[key] = (result, size)
+            self._result_bytes += size
+            while self._result_bytes > self.memory_limit and self._results:
+                _, (_, evicted_size) = self._results.popitem(last=False)
+                self._result_bytes -= evicted_size
@@ -0,0 +1,271 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+
+MEMORY = 'memory'
+DISK = 'disk'
+
+# Byte totals per tier are kept up to date by triggers, so checking the
+# limits never has to scan the directories.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    tier TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (tier, used);
+CREATE TABLE IF NOT EXISTS totals (tier TEXT PRIMARY KEY, bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals VALUES ('memory', 0), ('disk', 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE totals SET bytes = bytes + NEW.size WHERE tier = NEW.tier;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size WHERE tier = OLD.tier;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF tier, size ON entries BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size WHERE tier = OLD.tier;
+    UPDATE totals SET bytes = bytes + NEW.size WHERE tier = NEW.tier;
+END;
+"""
+
+EVICTION_BATCH = 32
+
+
+def default_memory_dir():
+    # /dev/shm is RAM-backed on Linux, so mapped pages are shared between
+    # worker processes without touching the disk. Fall back to the temp dir.
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'qiskit_visualizer_states')
+
+
+def default_disk_dir():
+    return os.path.join(tempfile.gettempdir(), 'qiskit_visualizer_states_cold')
+
+
+class StatevectorStore:
+    """Statevectors keyed by circuit QASM, shared between worker processes.
+
+    States are saved as .npy files and read back with
+    ``np.load(mmap_mode='r')``, so every worker handling the session gets a
+    zero-copy, read-only view of the same pages. New states go to
+    ``memory_dir`` (tmpfs by default). Once that tier holds more than
+    ``memory_limit`` bytes its least recently used files are moved to
+    ``disk_dir``, which in turn drops its least recently used files beyond
+    ``disk_limit`` bytes. A state found on disk is moved back to memory.
+
+    Sizes and last use of every file are tracked in a sqlite index in
+    ``disk_dir`` that all workers share. ``memory_limit`` defaults to 512 MB,
+    capped at half the size of the filesystem behind ``memory_dir``.
+    """
+
+    def __init__(self, memory_dir=None, disk_dir=None, memory_limit=None,
+                 disk_limit=4 * 1024 * 1024 * 1024):
+        self.memory_dir = memory_dir or default_memory_dir()
+        self.disk_dir = disk_dir or default_disk_dir()
+        os.makedirs(self.memory_dir, exist_ok=True)
+        os.makedirs(self.disk_dir, exist_ok=True)
+        if memory_limit is None:
+            # Docker mounts a 64 MB /dev/shm by default
+            memory_limit = min(512 * 1024 * 1024, shutil.disk_usage(self.memory_dir).total // 2)
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.index_path = os.path.join(self.disk_dir, 'index.sqlite3')
+        self._local = threading.local()
+        self._init_index()
+
+    @staticmethod
+    def key(qasm):
+        return hashlib.sha256(qasm.encode('utf-8')).hexdigest()
+
+    def _dir(self, tier):
+        return self.memory_dir if tier == MEMORY else self.disk_dir
+
+    def _path(self, directory, key):
+        return os.path.join(directory, f'{key}.npy')
+
+    def _db(self):
+        # sqlite connections must not cross threads or forks
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.index_path, timeout=10, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_index(self):
+        db = self._db()
+        db.execute('PRAGMA journal_mode=WAL')
+        is_new = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entries'"
+        ).fetchone() is None
+        db.executescript(SCHEMA)
+        if is_new:
+            # Pick up files left behind by an earlier index, once
+            for tier in (DISK, MEMORY):
+                directory = self._dir(tier)
+                for name in os.listdir(directory):
+                    if not name.endswith('.npy'):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(directory, name))
+                    except FileNotFoundError:
+                        continue
+                    self._record(name[:-len('.npy')], tier, stat.st_size, stat.st_mtime)
+
+    def _record(self, key, tier, size, used=None):
+        self._db().execute(
+            'INSERT INTO entries (key, tier, size, used) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET tier = excluded.tier, size = excluded.size, '
+            'used = excluded.used',
+            (key, tier, size, time.time() if used is None else used)
+        )
+
+    def _touch(self, key):
+        self._db().execute('UPDATE entries SET used = ? WHERE key = ?', (time.time(), key))
+
+    def _forget(self, key, tier):
+        self._db().execute('DELETE FROM entries WHERE key = ? AND tier = ?', (key, tier))
+
+    def _total(self, tier):
+        return self._db().execute('SELECT bytes FROM totals WHERE tier = ?', (tier,)).fetchone()[0]
+
+    @staticmethod
+    def _load(path):
+        try:
+            return np.load(path, mmap_mode='r')
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    def get(self, qasm):
+        key = self.key(qasm)
+        view = self._load(self._path(self.memory_dir, key))
+        if view is not None:
+            self._touch(key)
+            return view
+
+        disk_path = self._path(self.disk_dir, key)
+        view = self._load(disk_path)
+        if view is None:
+            self._forget(key, MEMORY)
+            self._forget(key, DISK)
+            return None
+
+        view = self.put(qasm, view)
+        if os.path.exists(self._path(self.memory_dir, key)):
+            try:
+                os.remove(disk_path)
+            except FileNotFoundError:
+                pass
+        return view
+
+    def put(self, qasm, statevector):
+        key = self.key(qasm)
+        path = self._path(self.memory_dir, key)
+
+        view = self._load(path)
+        if view is not None:
+            self._touch(key)
+            return view
+
+        data = np.ascontiguousarray(np.asarray(statevector, dtype=np.complex128))
+        try:
+            self._write(self.memory_dir, key, lambda f: np.save(f, data))
+        except OSError:
+            # Usually ENOSPC: the filesystem filled up below our own limit, so
+            # make room for this state and try once more
+            self._evict(keep=key, memory_limit=max(self._total(MEMORY) - data.nbytes, 0))
+            try:
+                self._write(self.memory_dir, key, lambda f: np.save(f, data))
+            except OSError:
+                return data
+
+        try:
+            self._record(key, MEMORY, os.path.getsize(path))
+        except FileNotFoundError:
+            return data
+        self._evict(keep=key)
+
+        # Another worker may have evicted the file in the meantime
+        view = self._load(path)
+        return view if view is not None else data
+
+    def get_or_compute(self, qasm, compute):
+        view = self.get(qasm)
+        if view is None:
+            view = self.put(qasm, compute())
+        return view
+
+    def _write(self, directory, key, write):
+        # Write under a unique name and rename so readers in other workers
+        # never map a partially written file.
+        tmp_path = os.path.join(directory, f'.{key}.{uuid.uuid4().hex}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, self._path(directory, key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _coldest(self, tier, keep):
+        return self._db().execute(
+            'SELECT key FROM entries WHERE tier = ? AND key != ? ORDER BY used LIMIT ?',
+            (tier, keep, EVICTION_BATCH)
+        ).fetchall()
+
+    def _evict(self, keep, memory_limit=None):
+        if memory_limit is None:
+            memory_limit = self.memory_limit
+
+        while self._total(MEMORY) > memory_limit:
+            victims = self._coldest(MEMORY, keep)
+            if not victims:
+                break
+            for (key,) in victims:
+                self._move_to_disk(key)
+                if self._total(MEMORY) <= memory_limit:
+                    break
+
+        while self._total(DISK) > self.disk_limit:
+            victims = self._coldest(DISK, keep)
+            if not victims:
+                break
+            for (key,) in victims:
+                try:
+                    os.remove(self._path(self.disk_dir, key))
+                except FileNotFoundError:
+                    pass
+                self._forget(key, DISK)
+                if self._total(DISK) <= self.disk_limit:
+                    break
+
+    def _move_to_disk(self, key):
+        src = self._path(self.memory_dir, key)
+        try:
+            with open(src, 'rb') as f:
+                self._write(self.disk_dir, key, lambda out: shutil.copyfileobj(f, out))
+            # Workers that already mapped the file keep their view
+            os.remove(src)
+        except FileNotFoundError:
+            # Another worker moved it first, or the file is gone
+            if not os.path.exists(self._path(self.disk_dir, key)):
+                self._forget(key, MEMORY)
+                return
+        except OSError:
+            # No room on disk either; drop the state rather than keep tmpfs full
+            try:
+                os.remove(src)
+            except FileNotFoundError:
+                pass
+            self._forget(key, MEMORY)
+            return
+        self._db().execute("UPDATE entries SET tier = 'disk' WHERE key = ? AND tier = 'memory'",
+                           (key,))
@@ -0,0 +1,199 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import speculation
+from speculation import SpeculativeEngine, apply_gate, candidate_gates, describe_state, rank_candidates
+from statevector_store import StatevectorStore
+
+try:
+    from qiskit import QuantumCircuit
+    from qiskit.quantum_info import Pauli, Statevector
+except ImportError:
+    QuantumCircuit = None
+
+requires_qiskit = pytest.mark.skipif(QuantumCircuit is None, reason='qiskit is not installed')
+
+NUM_QUBITS = 3
+
+
+def prepared_circuit():
+    # An uneven, entangled state so that misplaced axes change the result
+    circuit = QuantumCircuit(NUM_QUBITS)
+    circuit.h(0)
+    circuit.cx(0, 2)
+    circuit.y(1)
+    circuit.h(2)
+    return circuit
+
+
+def append_gate(circuit, gate, target, control):
+    if gate == 'cx':
+        circuit.cx(control, target)
+    elif gate == 'swap':
+        circuit.swap(control, target)
+    else:
+        getattr(circuit, gate)(target)
+
+
+@requires_qiskit
+@pytest.mark.parametrize('gate,target,control', list(candidate_gates(NUM_QUBITS)))
+def test_apply_gate_matches_qiskit(gate, target, control):
+    circuit = prepared_circuit()
+    state = Statevector.from_instruction(circuit).data
+    append_gate(circuit, gate, target, control)
+    expected = Statevector.from_instruction(circuit)
+
+    result = apply_gate(state, NUM_QUBITS, gate, target, control)
+    assert np.allclose(result, expected.data)
+
+    info = describe_state(result, NUM_QUBITS)
+    probabilities = expected.probabilities_dict()
+    assert info['probabilities'].keys() == {k for k, p in probabilities.items() if p > 1e-12}
+    for bits, p in info['probabilities'].items():
+        assert np.isclose(p, probabilities[bits])
+    for qubit, vector in enumerate(info['bloch_vectors']):
+        assert np.allclose(vector, [expected.expectation_value(Pauli(axis), [qubit]).real
+                                    for axis in 'XYZ'])
+
+
+def test_rank_candidates_prefers_recent_clicks():
+    history = [['h', 0, None], ['cx', 1, 0]]
+    assert rank_candidates(NUM_QUBITS, history)[:2] == [('cx', 1, 0), ('h', 0, None)]
+
+
+def zero_state():
+    state = np.zeros(2 ** NUM_QUBITS, dtype=complex)
+    state[0] = 1
+    return state
+
+
+def make_engine(tmp_path, **kwargs):
+    store = StatevectorStore(memory_dir=str(tmp_path / 'memory'), disk_dir=str(tmp_path / 'disk'),
+                             memory_limit=1024 * 1024)
+    kwargs.setdefault('max_candidates', 5)
+    kwargs.setdefault('time_budget', 5)
+    kwargs.setdefault('cpu_share', 1)
+    return SpeculativeEngine(store, **kwargs)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def idle(engine):
+    with engine._lock:
+        return engine._running is None and not engine._jobs
+
+
+@pytest.fixture
+def blocked_describe(monkeypatch):
+    """Holds the first candidate of a round until ``release`` is set."""
+    started = threading.Event()
+    release = threading.Event()
+
+    def describe(state, num_qubits):
+        started.set()
+        release.wait(5)
+        return describe_state(state, num_qubits)
+
+    monkeypatch.setattr(speculation, 'describe_state', describe)
+    return started, release
+
+
+def test_sessions_do_not_cancel_each_other(tmp_path):
+    engine = make_engine(tmp_path)
+
+    engine.schedule('alice', 'a', zero_state(), NUM_QUBITS, [])
+    engine.schedule('bob', 'b', zero_state(), NUM_QUBITS, [])
+    engine.cancel('carol')
+
+    assert wait_until(lambda: idle(engine))
+    assert engine.lookup('a', 'h', 0) is not None
+    assert engine.lookup('b', 'h', 0) is not None
+
+
+def test_lookup_serves_results_from_another_worker(tmp_path):
+    engine = make_engine(tmp_path)
+    engine.schedule('alice', 'a', zero_state(), NUM_QUBITS, [])
+    assert wait_until(lambda: idle(engine))
+
+    other = SpeculativeEngine(engine.store)
+    result = other.lookup('a', 'h', 0)
+    assert np.allclose(result['statevector'], apply_gate(zero_state(), NUM_QUBITS, 'h', 0))
+    assert result['bloch_vectors'][0] == pytest.approx([1, 0, 0])
+
+
+def test_cancel_stops_the_running_round(tmp_path, blocked_describe):
+    started, release = blocked_describe
+    engine = make_engine(tmp_path)
+
+    engine.schedule('alice', 'a', zero_state(), NUM_QUBITS, [])
+    assert started.wait(5)
+    engine.cancel('alice')
+    release.set()
+
+    assert wait_until(lambda: idle(engine))
+    assert len(engine._results) == 1
+
+
+def test_request_pauses_and_resumes_other_sessions(tmp_path, blocked_describe):
+    started, release = blocked_describe
+    engine = make_engine(tmp_path)
+
+    engine.schedule('alice', 'a', zero_state(), NUM_QUBITS, [])
+    assert started.wait(5)
+    engine.begin_request('bob')
+    release.set()
+
+    assert wait_until(lambda: 'alice' in engine._jobs)
+    assert len(engine._results) == 1
+
+    engine.end_request()
+    assert wait_until(lambda: idle(engine))
+    assert len(engine._results) == 5
+
+
+def test_time_budget_limits_a_round(tmp_path, monkeypatch):
+    def slow_describe(state, num_qubits):
+        time.sleep(0.05)
+        return describe_state(state, num_qubits)
+
+    monkeypatch.setattr(speculation, 'describe_state', slow_describe)
+    engine = make_engine(tmp_path, max_candidates=20, time_budget=0.1)
+
+    engine.schedule('alice', 'a', zero_state(), NUM_QUBITS, [])
+    assert wait_until(lambda: idle(engine))
+    assert 1 <= len(engine._results) <= 3
+
+
+def test_cpu_share_throttles_the_thread(tmp_path, monkeypatch):
+    def slow_describe(state, num_qubits):
+        time.sleep(0.05)
+        return describe_state(state, num_qubits)
+
+    monkeypatch.setattr(speculation, 'describe_state', slow_describe)
+    engine = make_engine(tmp_path, max_candidates=4, cpu_share=0.5)
+
+    started = time.monotonic()
+    engine.schedule('alice', 'a', zero_state(), NUM_QUBITS, [])
+    assert wait_until(lambda: idle(engine))
+    assert time.monotonic() - started >= 0.35
+
+
+def test_results_stay_within_memory_limit(tmp_path):
+    size = speculation._result_size(describe_state(zero_state(), NUM_QUBITS))
+    engine = make_engine(tmp_path, max_candidates=20, memory_limit=3 * size)
+
+    engine.schedule('alice', 'a', zero_state(), NUM_QUBITS, [])
+    assert wait_until(lambda: idle(engine))
+    assert 0 < engine._result_bytes <= engine.memory_limit
+    # Evicted results are still served from the shared store
+    assert engine.lookup('a', 'h', 0) is not None
@@ -0,0 +1,162 @@
+import errno
+import os
+import shutil
+
+import numpy as np
+
+from statevector_store import StatevectorStore
+
+STATE_BYTES = 16 * 16 + 128  # 16 complex128 amplitudes plus the .npy header
+
+
+def make_store(tmp_path, memory_states=2, disk_states=2):
+    return StatevectorStore(
+        memory_dir=str(tmp_path / 'memory'),
+        disk_dir=str(tmp_path / 'disk'),
+        memory_limit=memory_states * STATE_BYTES,
+        disk_limit=disk_states * STATE_BYTES
+    )
+
+
+def state(i):
+    return np.arange(16, dtype=complex) * (i + 1)
+
+
+def age(store, qasm, seconds):
+    store._db().execute('UPDATE entries SET used = ? WHERE key = ?', (seconds, store.key(qasm)))
+
+
+def test_put_then_get_returns_mapped_state(tmp_path):
+    store = make_store(tmp_path)
+    store.put('a', state(0))
+
+    view = store.get('a')
+    assert isinstance(view, np.memmap)
+    assert np.array_equal(view, state(0))
+    assert store.get('b') is None
+
+
+def test_get_or_compute_only_computes_once(tmp_path):
+    store = make_store(tmp_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return state(0)
+
+    store.get_or_compute('a', compute)
+    store.get_or_compute('a', compute)
+    assert len(calls) == 1
+
+
+def test_coldest_states_move_to_disk(tmp_path):
+    store = make_store(tmp_path, memory_states=2, disk_states=10)
+    store.put('a', state(0))
+    store.put('b', state(1))
+    age(store, 'a', 100)
+    age(store, 'b', 200)
+    store.get('a')  # a is now the most recently used
+
+    store.put('c', state(2))
+
+    assert os.path.exists(store._path(store.disk_dir, store.key('b')))
+    assert not os.path.exists(store._path(store.memory_dir, store.key('b')))
+    assert np.array_equal(store.get('b'), state(1))
+    # A disk hit moves the state back to memory
+    assert os.path.exists(store._path(store.memory_dir, store.key('b')))
+    assert not os.path.exists(store._path(store.disk_dir, store.key('b')))
+
+
+def test_disk_tier_drops_least_recently_used(tmp_path):
+    store = make_store(tmp_path, memory_states=0, disk_states=1)
+    store.put('a', state(0))
+    store.put('b', state(1))  # moves a to disk
+    age(store, 'a', 100)
+    age(store, 'b', 200)
+
+    store.put('c', state(2))  # moves b to disk, which drops a
+
+    assert store.get('a') is None
+    assert np.array_equal(store.get('b'), state(1))
+
+
+def test_put_larger_than_limits_still_returns_state(tmp_path):
+    store = StatevectorStore(
+        memory_dir=str(tmp_path / 'memory'),
+        disk_dir=str(tmp_path / 'disk'),
+        memory_limit=0,
+        disk_limit=0
+    )
+    assert np.array_equal(store.put('a', state(0)), state(0))
+
+
+def test_put_survives_file_removed_by_another_worker(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    path = store._path(store.memory_dir, store.key('a'))
+
+    evict = store._evict
+
+    def evict_and_remove(keep, memory_limit=None):
+        evict(keep, memory_limit)
+        os.remove(path)
+
+    monkeypatch.setattr(store, '_evict', evict_and_remove)
+    assert np.array_equal(store.put('a', state(0)), state(0))
+
+
+def test_put_does_not_scan_directories(tmp_path, monkeypatch):
+    store = make_store(tmp_path, memory_states=5, disk_states=5)
+
+    def no_scan(*args):
+        raise AssertionError('directory scanned')
+
+    monkeypatch.setattr(os, 'listdir', no_scan)
+    monkeypatch.setattr(os, 'scandir', no_scan)
+    for i in range(20):
+        store.put(f'q{i}', state(i))
+
+    assert store._total('memory') <= store.memory_limit
+    assert store._total('disk') <= store.disk_limit
+    assert np.array_equal(store.get('q19'), state(19))
+
+
+def test_index_is_rebuilt_from_existing_files(tmp_path):
+    store = make_store(tmp_path, memory_states=5)
+    store.put('a', state(0))
+    os.remove(store.index_path)
+
+    store = make_store(tmp_path, memory_states=5)
+    assert store._total('memory') == os.path.getsize(store._path(store.memory_dir, store.key('a')))
+
+
+def test_full_memory_filesystem_evicts_and_retries(tmp_path, monkeypatch):
+    store = make_store(tmp_path, memory_states=5, disk_states=5)
+    store.put('a', state(0))
+
+    write = store._write
+    failures = []
+
+    def write_after_enospc(directory, key, writer):
+        if directory == store.memory_dir and not failures:
+            failures.append(key)
+            raise OSError(errno.ENOSPC, 'No space left on device')
+        write(directory, key, writer)
+
+    monkeypatch.setattr(store, '_write', write_after_enospc)
+    assert isinstance(store.put('b', state(1)), np.memmap)
+    assert os.path.exists(store._path(store.disk_dir, store.key('a')))
+
+
+def test_unwritable_memory_filesystem_returns_state(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+
+    def fail(directory, key, writer):
+        raise OSError(errno.ENOSPC, 'No space left on device')
+
+    monkeypatch.setattr(store, '_write', fail)
+    assert np.array_equal(store.put('a', state(0)), state(0))
+
+
+def test_default_memory_limit_fits_filesystem(tmp_path):
+    store = StatevectorStore(memory_dir=str(tmp_path / 'memory'), disk_dir=str(tmp_path / 'disk'))
+    assert store.memory_limit <= shutil.disk_usage(store.memory_dir).total // 2